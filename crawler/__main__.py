@@ -1,29 +1,71 @@
 """Crawl the web."""
 
 import asyncio
+import contextlib
+import gzip
+import logging.handlers
+import os
 import pickle
+import queue
 import signal
+from collections.abc import Iterator
 
+try:
+    from uvloop import run
+except ImportError:  # uvloop does not support Windows
+    from asyncio import run
+
+from . import logger
 from .crawler import Crawler
 from .http import URL
 
 
+def _load_crawler() -> Crawler:
+    """Load the crawler from the latest checkpoint or create a new one."""
+    with contextlib.suppress(FileNotFoundError):
+        with gzip.open("state.pkl.gz", "rb") as file:
+            return pickle.load(file)
+
+    with contextlib.suppress(FileNotFoundError):
+        with open("state.pkl", "rb") as file:
+            return pickle.load(file)
+
+    crawler = Crawler()
+    crawler.add_url(URL.from_string("https://en.wikipedia.org"))
+    return crawler
+
+
+@contextlib.contextmanager
+def _queued_logging() -> Iterator[None]:
+    """Write log records from a background thread while the crawler runs."""
+    handlers = logger.handlers
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+        logger.handlers = handlers
+
+
 async def main() -> None:
     """Run main function."""
-    try:
-        with open("state.pkl", "rb") as file:
-            crawler = pickle.load(file)
-    except FileNotFoundError:
-        crawler = Crawler()
-        crawler.add_url(URL.from_string("https://en.wikipedia.org"))
+    crawler = _load_crawler()
 
     asyncio.get_running_loop().add_signal_handler(signal.SIGINT, crawler.stop)
     async with crawler:
         await crawler.run()
 
-    with open("state.pkl", "wb") as file:
-        pickle.dump(crawler, file)
+    with gzip.open("state.pkl.gz.tmp", "wb", compresslevel=1) as file:
+        pickle.dump(crawler, file, pickle.HIGHEST_PROTOCOL)
+    os.replace("state.pkl.gz.tmp", "state.pkl.gz")
+    with contextlib.suppress(FileNotFoundError):
+        os.remove("state.pkl")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with _queued_logging():
+        run(main())
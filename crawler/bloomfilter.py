@@ -0,0 +1,31 @@
+"""Bloom filter for strings."""
+
+import hashlib
+import math
+from collections.abc import Iterator
+
+
+class BloomFilter:
+    """Probabilistic set of strings w/o false negatives."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """Initialize empty filter sized for capacity items at error_rate."""
+        self._size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _indices(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hashes):
+            yield (h1 + i * h2) % self._size
+
+    def __contains__(self, item: str) -> bool:
+        """Check if the item may have been added."""
+        return all(self._bits[i >> 3] & (1 << (i & 7)) for i in self._indices(item))
+
+    def add(self, item: str) -> None:
+        """Add an item to the filter."""
+        for i in self._indices(item):
+            self._bits[i >> 3] |= 1 << (i & 7)
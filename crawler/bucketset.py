@@ -0,0 +1,106 @@
+"""Set of items grouped into buckets."""
+
+from collections.abc import Callable, Hashable, Iterable, Iterator, KeysView
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T", bound=Hashable)
+
+
+class BucketSet(Generic[K, T]):
+    """
+    Set of items grouped into buckets by a key function.
+
+    Keys can be blocked. The keys of all non-empty buckets that are not blocked
+    are kept up to date as the ready keys.
+    """
+
+    def __init__(self, key: Callable[[T], K]) -> None:
+        """Initialize empty bucket set."""
+        self._key = key
+        self._dict: dict[K, set[T]] = {}
+        self._size = 0
+        self._blocked: set[K] = set()
+        self._ready: set[K] = set()
+
+    def __contains__(self, item: T) -> bool:
+        """Check if the item is in its bucket."""
+        return item in self._dict.get(self._key(item), ())
+
+    def __iter__(self) -> Iterator[T]:
+        """Iterate over all items of all buckets."""
+        for bucket in self._dict.values():
+            yield from bucket
+
+    def __len__(self) -> int:
+        """Return the number of items in all buckets."""
+        return self._size
+
+    def _remove_bucket_if_empty(self, key: K) -> None:
+        if not self._dict[key]:
+            del self._dict[key]
+            self._ready.discard(key)
+
+    def add(self, item: T) -> None:
+        """Add an item to its bucket."""
+        key = self._key(item)
+        if (bucket := self._dict.get(key)) is None:
+            bucket = self._dict[key] = set()
+            if key not in self._blocked:
+                self._ready.add(key)
+
+        if item not in bucket:
+            bucket.add(item)
+            self._size += 1
+
+    def update(self, items: Iterable[T]) -> None:
+        """Add multiple items to their buckets."""
+        for item in items:
+            self.add(item)
+
+    def discard(self, item: T) -> None:
+        """Remove an item from its bucket if present."""
+        key = self._key(item)
+        if (bucket := self._dict.get(key)) is None or item not in bucket:
+            return
+
+        bucket.remove(item)
+        self._size -= 1
+        self._remove_bucket_if_empty(key)
+
+    def keys(self) -> KeysView[K]:
+        """Return the keys of all non-empty buckets."""
+        return self._dict.keys()
+
+    def pop(self, key: K) -> T:
+        """Remove and return an arbitrary item from the bucket of the key."""
+        item = self._dict[key].pop()
+        self._size -= 1
+        self._remove_bucket_if_empty(key)
+        return item
+
+    def block(self, key: K) -> None:
+        """Block the key so its bucket is not ready."""
+        self._blocked.add(key)
+        self._ready.discard(key)
+
+    def unblock(self, key: K) -> None:
+        """Unblock the key so its bucket is ready again if non-empty."""
+        self._blocked.discard(key)
+        if key in self._dict:
+            self._ready.add(key)
+
+    def ready_count(self) -> int:
+        """Return the number of ready keys."""
+        return len(self._ready)
+
+    def pop_ready(self) -> T:
+        """
+        Remove and return an item from the bucket of any ready key.
+
+        The key of the item is blocked until it is unblocked again.
+        Raises KeyError if no key is ready.
+        """
+        key = self._ready.pop()
+        self.block(key)
+        return self.pop(key)
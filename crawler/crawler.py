@@ -1,23 +1,67 @@
 """The crawler that can crawl the internet."""
 
 import asyncio
+import collections
 import contextlib
+import hashlib
+import heapq
 import logging
-import re
-import time
-from typing import Any
+import operator
+from typing import Any, Optional
 
 import httpx
 from lxml import etree, html
 
 from . import Logger, db, logger
+from .bloomfilter import BloomFilter
+from .bucketset import BucketSet
 from .http import URL, HTTPError, Pool
 from .robots import RobotsFileTable
-from .utils import HTML_CLEANER, get_lang, get_links
+from .utils import (
+    HTML_CLEANER,
+    UnwantedLanguageError,
+    get_lang,
+    get_links,
+    parse_html,
+)
 
-_LANG_REGEX = re.compile(r"\b(?:en|de)\b", re.A | re.I)
-_NOINDEX_REGEX = re.compile(r"\bnoindex\b", re.A | re.I)
-_NOFOLLOW_REGEX = re.compile(r"\bnofollow\b", re.A | re.I)
+_LANGS = ("en", "de")
+_ROBOTS_DIRECTIVES = ("noindex", "nofollow")
+_PAGE_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.1",
+    "Accept-Language": "en,de;q=0.9",
+}
+
+_CHUNK_SIZE = 64 * 1024
+
+_MAX_TASKS = 128
+
+_STORED_URLS_CAPACITY = 10_000_000
+_STORED_URLS_ERROR_RATE = 1e-4
+
+_FLUSH_SIZE = 200
+_FLUSH_INTERVAL = 5
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and (char.isalnum() or char == "_")
+
+
+def _has_token(haystack: str, needle: str) -> bool:
+    start = haystack.find(needle)
+    while start >= 0:
+        end = start + len(needle)
+        if (start == 0 or not _is_word_char(haystack[start - 1])) and (
+            end == len(haystack) or not _is_word_char(haystack[end])
+        ):
+            return True
+        start = haystack.find(needle, start + 1)
+    return False
+
+
+def _robots_directives(response: httpx.Response) -> set[str]:
+    robots = response.headers.get("X-Robots-Tag", "").lower()
+    return {d for d in _ROBOTS_DIRECTIVES if _has_token(robots, d)}
 
 
 def _check_headers(response: httpx.Response, log: Logger) -> bool:
@@ -30,37 +74,88 @@ def _check_headers(response: httpx.Response, log: Logger) -> bool:
         log.info("not html (%s)", content_type)
         return False
 
+    if len(_robots_directives(response)) == len(_ROBOTS_DIRECTIVES):
+        log.info("noindex, nofollow (%s)", response.headers["X-Robots-Tag"])
+        return False
+
     return True
 
 
-def _index(response: httpx.Response, dom: html.HtmlElement, log: Logger) -> bool:
-    robots = response.headers.get("X-Robots-Tag", "")
-    if _NOINDEX_REGEX.search(robots):
-        log.info("noindex (%s)", robots)
+def _index_headers(
+    response: httpx.Response,
+    directives: set[str],
+    log: Logger,
+) -> bool:
+    if "noindex" in directives:
+        log.info("noindex (%s)", response.headers["X-Robots-Tag"])
         return False
 
-    lang = response.headers.get("Content-Language", "en")
-    if not _LANG_REGEX.search(lang):
-        log.debug("not en or de (%s)", lang)
+    content_language = response.headers.get("Content-Language", "en").lower()
+    if not any(_has_token(content_language, lang) for lang in _LANGS):
+        log.debug("not en or de (%s)", content_language)
         return False
 
+    return True
+
+
+def _index_dom(dom: html.HtmlElement, log: Logger) -> bool:
     lang = get_lang(dom)
-    if lang not in {"en", "de"}:
+    if lang not in _LANGS:
         log.debug("not en or de (%s)", lang)
         return False
 
     return True
 
 
-def _follow(response: httpx.Response, log: Logger) -> bool:
-    robots = response.headers.get("X-Robots-Tag", "")
-    if _NOFOLLOW_REGEX.search(robots):
-        log.info("nofollow (%s)", robots)
+def _follow(response: httpx.Response, directives: set[str], log: Logger) -> bool:
+    if "nofollow" in directives:
+        log.info("nofollow (%s)", response.headers["X-Robots-Tag"])
         return False
 
     return True
 
 
+def _process_page(
+    url: URL,
+    response: httpx.Response,
+    dom: html.HtmlElement,
+    log: Logger,
+) -> tuple[Optional[bytes], set[URL]]:
+    directives = _robots_directives(response)
+
+    content = None
+    if _index_headers(response, directives, log):
+        HTML_CLEANER(dom)
+        if _index_dom(dom, log):
+            content = html.tostring(dom)
+
+    links: set[URL] = set()
+    if _follow(response, directives, log):
+        links = get_links(url, dom)
+
+    return content, links
+
+
+_DIGEST_SIZE = 16
+
+
+def _url_digest(url: URL) -> bytes:
+    url_bytes = str(url.normalize()).encode()
+    return hashlib.blake2b(url_bytes, digest_size=_DIGEST_SIZE).digest()
+
+
+def _upgrade_state(state: dict[str, Any]) -> dict[str, Any]:
+    """Convert the state of a legacy state.pkl checkpoint w/ sets of URLs."""
+    if isinstance(state["_finished_urls"], bytes):
+        return state
+
+    return {
+        "_robots_file_table": state["_robots_file_table"],
+        "_pending_urls": [str(url) for url in state["_pending_urls"]],
+        "_finished_urls": b"".join(map(_url_digest, state["_finished_urls"])),
+    }
+
+
 class Crawler:
     """The crawler."""
 
@@ -68,53 +163,113 @@ class Crawler:
         """Return state used by pickle."""
         return {
             "_robots_file_table": self._robots_file_table,
-            "_timeouts": self._timeouts,
-            "_pending_urls": self._pending_urls,
-            "_finished_urls": self._finished_urls,
+            "_pending_urls": [str(url) for url in self._pending_urls],
+            "_finished_urls": b"".join(self._finished_urls),
         }
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         """Restore state used by pickle."""
         self._pool = Pool()
         self._db = db.Session()
-        self._stopping = False
+        self._stop_event = asyncio.Event()
+        self._idle_workers: collections.deque[asyncio.Future[None]] = (
+            collections.deque()
+        )
+        self._flush_event = asyncio.Event()
+        self._write_task: Optional[asyncio.Task[None]] = None
+        self._active_hosts: dict[str, URL] = {}
+        self._timeouts: dict[str, float] = {}
+        self._host_deadlines: list[tuple[float, str]] = []
+        self._new_documents: list[dict[str, Any]] = []
+        self._updated_documents: list[dict[str, Any]] = []
+
+        state = _upgrade_state(state)
+        self._robots_file_table: RobotsFileTable = state["_robots_file_table"]
 
-        self.__dict__.update(state)
+        self._pending_urls: BucketSet[str, URL] = BucketSet(operator.attrgetter("host"))
+        self._pending_urls.update(map(URL.from_string, state["_pending_urls"]))
+
+        finished_urls = state["_finished_urls"]
+        self._finished_urls: set[bytes] = {
+            finished_urls[i : i + _DIGEST_SIZE]
+            for i in range(0, len(finished_urls), _DIGEST_SIZE)
+        }
 
     def __init__(self) -> None:
         """Initialize the crawler w/ empty backlog and no connections."""
-        self._robots_file_table = RobotsFileTable()
-        self._timeouts: dict[str, float] = {}
-        self._pending_urls: set[URL] = set()
-        self._finished_urls: set[URL] = set()
-
-        self.__setstate__({})
+        self.__setstate__(
+            {
+                "_robots_file_table": RobotsFileTable(),
+                "_pending_urls": [],
+                "_finished_urls": b"",
+            },
+        )
 
     async def __aenter__(self) -> "Crawler":
         """Call enter method of database connection."""
         await self._pool.__aenter__()
         self._db.__enter__()
+        self._stored_urls = await asyncio.to_thread(self._load_stored_urls)
         return self
 
     async def __aexit__(self, et, exc, tb) -> None:
         """Close database connection and all open http connections."""
+        await self._flush_documents()
         await self._pool.__aexit__(et, exc, tb)
         self._db.__exit__(et, exc, tb)
 
     def add_url(self, url: URL) -> None:
         """Add a URL to the pending URLs."""
         url = url.normalize()
-        self._pending_urls.add(url)
+        if _url_digest(url) not in self._finished_urls:
+            self._pending_urls.add(url)
+            self._wake_workers()
 
     def stop(self) -> None:
         """Start stopping all workers."""
         logger.warning("Stopping...")
-        self._stopping = True
+        self._stop_event.set()
+
+    def _load_stored_urls(self) -> BloomFilter:
+        stored_urls = BloomFilter(_STORED_URLS_CAPACITY, _STORED_URLS_ERROR_RATE)
+        for url in self._db.scalars(db.SELECT_URLS):
+            stored_urls.add(url)
+        return stored_urls
+
+    def _write_documents(
+        self,
+        new_documents: list[dict[str, Any]],
+        updated_documents: list[dict[str, Any]],
+    ) -> None:
+        if new_documents:
+            self._db.execute(db.INSERT_DOCUMENTS, new_documents)
+        if updated_documents:
+            self._db.execute(db.UPSERT_DOCUMENTS, updated_documents)
+        self._db.commit()
+
+    async def _flush_documents(self) -> None:
+        # A cancelled flush keeps writing in its thread and the session is
+        # not thread-safe, so wait for it before starting the next write.
+        while self._write_task is not None and not self._write_task.done():
+            await asyncio.wait([self._write_task])
+
+        new_documents, self._new_documents = self._new_documents, []
+        updated_documents, self._updated_documents = self._updated_documents, []
+
+        self._write_task = asyncio.create_task(
+            asyncio.to_thread(
+                self._write_documents,
+                new_documents,
+                updated_documents,
+            ),
+        )
+        await asyncio.shield(self._write_task)
 
     async def _load_page(self, url: URL) -> set[URL]:
-        assert url not in self._finished_urls
+        assert _url_digest(url) not in self._finished_urls
 
-        log = logging.LoggerAdapter(logger, {"url": url})
+        url_str = str(url)
+        log = logging.LoggerAdapter(logger, {"url": url_str})
 
         robots_file = await self._robots_file_table.get(url.host, self._pool)
 
@@ -123,72 +278,129 @@ class Crawler:
             return set()
 
         try:
-            response = await self._pool.get(url, True)
-        except HTTPError as e:
-            log.info("http error %s: %s", e.__class__.__name__, e)
-            return set()
-        finally:
-            self._timeouts[url.host] = robots_file.timeout()
+            async with self._pool.stream_get(url, True, _PAGE_HEADERS) as response:
+                if response.is_redirect:
+                    assert response.next_request is not None
+                    next_url = URL.from_httpx_url(response.next_request.url)
+                    return {next_url.normalize()}
 
-        if response.is_redirect:
-            assert response.next_request is not None
-            return {URL.from_httpx_url(response.next_request.url)}
+                if not _check_headers(response, log):
+                    return set()
 
-        if not _check_headers(response, log):
+                dom = await parse_html(response.aiter_bytes(_CHUNK_SIZE), _LANGS)
+        except HTTPError as e:
+            log.info("http error %s: %s", e.__class__.__name__, e)
             return set()
-
-        try:
-            dom = html.document_fromstring(response.content, ensure_head_body=True)
         except etree.ParserError as e:
             log.info("parser error %s: %s", e.__class__.__name__, e)
             return set()
-        assert dom is not None
-        HTML_CLEANER(dom)
-
-        if _index(response, dom, log):
-            self._db.merge(db.Document(url=str(url), content=html.tostring(dom)))
-            self._db.commit()
-
-        if not _follow(response, log):
+        except UnwantedLanguageError as e:
+            log.debug("not en or de (%s)", e)
             return set()
+        finally:
+            delay = robots_file.delay()
+            self._timeouts[url.host] = asyncio.get_running_loop().time() + delay
 
-        return get_links(url, dom)
+        assert dom is not None
+        content, links = await asyncio.to_thread(
+            _process_page,
+            url,
+            response,
+            dom,
+            log,
+        )
+
+        if content is not None:
+            document = {"url": url_str, "content": content}
+            if url_str in self._stored_urls:
+                self._updated_documents.append(document)
+            else:
+                self._new_documents.append(document)
+                self._stored_urls.add(url_str)
+
+            if len(self._new_documents) + len(self._updated_documents) >= _FLUSH_SIZE:
+                self._flush_event.set()
+
+        return links
+
+    def _unblock_expired_hosts(self) -> None:
+        now = asyncio.get_running_loop().time()
+        while self._host_deadlines and self._host_deadlines[0][0] <= now:
+            _, host = heapq.heappop(self._host_deadlines)
+            self._pending_urls.unblock(host)
+
+    def _wake_workers(self) -> None:
+        """Wake as many idle workers as there are ready hosts."""
+        if not self._idle_workers:
+            return
+
+        self._unblock_expired_hosts()
+
+        ready = self._pending_urls.ready_count()
+        while ready and self._idle_workers:
+            waiter = self._idle_workers.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                ready -= 1
+
+    async def _next_url(self) -> URL:
+        while True:
+            self._unblock_expired_hosts()
+
+            with contextlib.suppress(KeyError):
+                url = self._pending_urls.pop_ready()
+                self._active_hosts[url.host] = url
+                return url
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._idle_workers.append(waiter)
+            await waiter
+
+    async def _worker(self) -> None:
+        while True:
+            url = await self._next_url()
+
+            try:
+                urls = await self._load_page(url)
+            except asyncio.CancelledError:
+                del self._active_hosts[url.host]
+                self._timeouts.pop(url.host, None)
+                self._pending_urls.add(url)
+                self._pending_urls.unblock(url.host)
+                raise
+
+            del self._active_hosts[url.host]
+            deadline = self._timeouts.pop(url.host, 0.0)
+            heapq.heappush(self._host_deadlines, (deadline, url.host))
+            asyncio.get_running_loop().call_at(deadline, self._wake_workers)
+            self._finished_urls.add(_url_digest(url))
+
+            links = {_url_digest(link): link for link in urls}
+            for digest in links.keys() - self._finished_urls:
+                link = links[digest]
+                if self._active_hosts.get(link.host) != link:
+                    self._pending_urls.add(link)
+            self._wake_workers()
+
+    async def _flusher(self) -> None:
+        while not self._stop_event.is_set():
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._flush_event.wait(), _FLUSH_INTERVAL)
+            self._flush_event.clear()
+            await self._flush_documents()
 
     async def run(self) -> None:
         """Run crawler."""
-        tasks: dict[asyncio.Task, URL] = {}
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(self._flusher())
+            workers = [
+                task_group.create_task(self._worker()) for _ in range(_MAX_TASKS)
+            ]
 
-        while not self._stopping:
-            for url in self._pending_urls.copy():
-                if len(tasks) >= 15:
-                    break
+            await self._stop_event.wait()
 
-                if time.time() < self._timeouts.get(url.host, 0):
-                    continue
-
-                if any(t.host == url.host for t in tasks.values()):
-                    continue
-
-                self._pending_urls.remove(url)
-                tasks[asyncio.create_task(self._load_page(url))] = url
-
-            done, _ = await asyncio.wait(
-                tasks.keys(),
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            for task in done:
-                self._finished_urls.add(tasks.pop(task))
-
-                urls = task.result()
-                urls.difference_update(self._finished_urls)
-                urls.difference_update(tasks.values())
-                self._pending_urls.update(urls)
-
-        for task, url in tasks.items():
-            task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await task
-            self._pending_urls.add(url)
+            for worker in workers:
+                worker.cancel()
+            self._flush_event.set()
 
-        self._stopping = False
+        self._stop_event.clear()
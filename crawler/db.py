@@ -1,9 +1,50 @@
 """Code for the database."""
 
+import threading
+from typing import Any, Optional
+
 import sqlalchemy
-from sqlalchemy import Column, String
+import zstandard
+from sqlalchemy import Column, LargeBinary, String
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# zstd (de)compressors are not thread-safe and flushes run in worker threads.
+_zstd = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    if not hasattr(_zstd, "compressor"):
+        _zstd.compressor = zstandard.ZstdCompressor(level=6)
+    return _zstd.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    if not hasattr(_zstd, "decompressor"):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor
+
+
+class Compressed(sqlalchemy.TypeDecorator):
+    """Binary column that is transparently compressed w/ zstd."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[bytes], dialect: Any) -> Any:
+        """Compress the value before storing it."""
+        if value is None:
+            return None
+        return _compressor().compress(value)
+
+    def process_result_value(self, value: Optional[bytes], dialect: Any) -> Any:
+        """Decompress the stored value, passing uncompressed values through."""
+        if value is None or not value.startswith(_ZSTD_MAGIC):
+            return value
+        return _decompressor().decompress(value)
+
 
 class Document(declarative_base()):
     """Document in the database."""
@@ -11,12 +52,34 @@ class Document(declarative_base()):
     __tablename__ = "documents"
 
     url = Column(String, primary_key=True)
-    content = Column(String)
+    content = Column(Compressed)
 
 
-ENGINE = sqlalchemy.create_engine("sqlite+pysqlite:///data.db")
+SELECT_URLS = sqlalchemy.select(Document.url).execution_options(yield_per=10_000)
+INSERT_DOCUMENTS = sqlalchemy.insert(Document)
+_upsert = sqlite.insert(Document)
+UPSERT_DOCUMENTS = _upsert.on_conflict_do_update(
+    index_elements=[Document.url],
+    set_={"content": _upsert.excluded.content},
+)
+
+ENGINE = sqlalchemy.create_engine(
+    "sqlite+pysqlite:///data.db",
+    connect_args={"check_same_thread": False},
+)
 Session = sessionmaker(bind=ENGINE)
 
+
+@sqlalchemy.event.listens_for(ENGINE, "connect")
+def _set_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
 if __name__ == "__main__":
     session = Session()
     Document.metadata.create_all(ENGINE)
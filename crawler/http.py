@@ -1,12 +1,18 @@
 """HTTP client."""
 
+import contextlib
+import functools
 import ssl
+import sys
+from collections.abc import AsyncIterator, Iterable
 from typing import Any, NamedTuple, Optional
 from urllib.parse import quote, unquote, urljoin, _UNSAFE_URL_BYTES_TO_REMOVE
 
 import httpx
 
 USER_AGENT = "crawler"
+_NON_HTTP_PREFIXES = ("javascript:", "mailto:", "tel:", "data:")
+_UNSAFE_URL_CHARS = str.maketrans("", "", "".join(_UNSAFE_URL_BYTES_TO_REMOVE))
 
 
 class InvalidURLError(Exception):
@@ -47,22 +53,23 @@ class URL(NamedTuple):
         InvalidURLError.check(url)
 
         return cls(
-            url.host,
+            sys.intern(url.host),
             quote(unquote(url.path)),
             url.query.decode() or None,
         )
 
     @classmethod
+    @functools.lru_cache(maxsize=1 << 16)
     def from_string(cls, url: str) -> "URL":
         """Create a URL from a string."""
-        for b in _UNSAFE_URL_BYTES_TO_REMOVE:
-            url = url.replace(b, "")
+        url = url.translate(_UNSAFE_URL_CHARS)
 
         try:
             return cls.from_httpx_url(httpx.URL(url))
         except httpx.InvalidURL as e:
             raise InvalidURLError("url", url, str(e)) from e
 
+    @functools.lru_cache(maxsize=1 << 16)
     def normalize(self) -> "URL":
         """
         Apply a few more extreme normalizations to the URL.
@@ -87,6 +94,23 @@ class URL(NamedTuple):
         """Join two URLs."""
         return self.from_string(urljoin(str(self), url))
 
+    def join_all(self, urls: Iterable[str]) -> set["URL"]:
+        """Join many URLs to this one and normalize them, skipping invalid ones."""
+        base = str(self)
+        joined = set()
+
+        for url in set(urls):
+            if url.startswith(_NON_HTTP_PREFIXES):
+                continue
+            if url.startswith("#"):
+                joined.add(self.normalize())
+                continue
+
+            with contextlib.suppress(InvalidURLError):
+                joined.add(self.from_string(urljoin(base, url)).normalize())
+
+        return joined
+
     def __str__(self) -> str:
         """Convert the URL back to a string."""
         return f"https://{self.host}{self.target}"
@@ -110,6 +134,14 @@ HTTPError = (
 )
 
 
+def _check_redirect(response: httpx.Response, allow_redirect: bool) -> None:
+    if response.is_redirect:
+        if not allow_redirect:
+            raise httpx.TooManyRedirects("Too many redirects")
+        assert response.next_request is not None
+        InvalidURLError.check(response.next_request.url)
+
+
 class Pool(httpx.AsyncClient):
     """Async connection pool with custom get method."""
 
@@ -118,16 +150,29 @@ class Pool(httpx.AsyncClient):
         super().__init__(
             headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"},
             timeout=httpx.Timeout(connect=4, write=1, read=10, pool=None),
+            http2=True,
+            trust_env=False,
+            limits=httpx.Limits(
+                max_connections=1024,
+                max_keepalive_connections=256,
+                keepalive_expiry=30,
+            ),
         )
 
     async def get(self, url: URL, allow_redirect: bool) -> httpx.Response:
         """Perform a GET request."""
         response = await super().get(url.to_httpx_url())
-
-        if response.is_redirect:
-            if not allow_redirect:
-                raise httpx.TooManyRedirects("Too many redirects")
-            assert response.next_request is not None
-            InvalidURLError.check(response.next_request.url)
-
+        _check_redirect(response, allow_redirect)
         return response
+
+    @contextlib.asynccontextmanager
+    async def stream_get(
+        self,
+        url: URL,
+        allow_redirect: bool,
+        headers: Optional[dict[str, str]] = None,
+    ) -> AsyncIterator[httpx.Response]:
+        """Perform a GET request w/o reading the body upfront."""
+        async with self.stream("GET", url.to_httpx_url(), headers=headers) as response:
+            _check_redirect(response, allow_redirect)
+            yield response
@@ -1,12 +1,16 @@
 """Module to deal with robots.txt files."""
 
 import asyncio
+import collections
 import math
 import time
+import urllib.parse
 import urllib.robotparser
+from typing import Any, Optional
 
 import httpx
 
+from . import logger
 from .http import URL, USER_AGENT, HTTPError, InvalidURLError, Pool
 
 
@@ -15,14 +19,39 @@ class RobotsFile(urllib.robotparser.RobotFileParser):
 
     def __init__(self) -> None:
         """Initialize empty robots file."""
-        self.lock = asyncio.Lock()
         super().__init__()
         self.modified()
+        self._entry: Optional[urllib.robotparser.Entry] = None
+        self._delay = 0.0
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the robots file and resolve the entry for the user agent."""
+        state.pop("lock", None)  # legacy checkpoints stored a lock per file
+        self.__dict__.update(state)
+        self._resolve_user_agent()
+
+    def _resolve_user_agent(self) -> None:
+        self._entry = next(
+            (entry for entry in self.entries if entry.applies_to(USER_AGENT)),
+            self.default_entry,
+        )
+
+        if self._entry is None:
+            self._delay = 0.0
+            return
+
+        delay = 0 if self._entry.delay is None else float(self._entry.delay)
+
+        rate = self._entry.req_rate
+        rate = math.inf if rate is None else (rate.requests / rate.seconds)
+
+        self._delay = max(delay, 1 / rate)
 
     def parse(self, response: httpx.Response) -> None:
         """Parse the robots.txt file response."""
         if response.is_success:
-            super().parse(response.text.splitlines())
+            super().parse(response.content.decode(errors="replace").splitlines())
+            self._resolve_user_agent()
         elif response.is_client_error and response.status_code != 429:
             self.allow_all = True
         else:
@@ -36,19 +65,19 @@ class RobotsFile(urllib.robotparser.RobotFileParser):
     def can_fetch(self, url: URL) -> bool:
         """Check if robot can fetch the given URL."""
         assert self.mtime()
-        return super().can_fetch(USER_AGENT, str(url))
 
-    def timeout(self) -> float:
-        """Get the timeout for the next request."""
-        assert self.mtime()
-
-        delay = self.crawl_delay(USER_AGENT)
-        delay = 0 if delay is None else float(delay)
+        if self.disallow_all:
+            return False
+        if self.allow_all or self._entry is None:
+            return True
 
-        rate = self.request_rate(USER_AGENT)
-        rate = math.inf if rate is None else (rate.requests / rate.seconds)
+        path = urllib.parse.quote(urllib.parse.unquote(url.target))
+        return self._entry.allowance(path)
 
-        return time.time() + max(delay, 1 / rate)
+    def delay(self) -> float:
+        """Get the delay in seconds before the next request."""
+        assert self.mtime()
+        return self._delay
 
 
 class RobotsFileTable:
@@ -56,39 +85,65 @@ class RobotsFileTable:
 
     def __init__(self) -> None:
         """Initialize empty robots file table."""
-        self._table: dict[URL, RobotsFile] = {}
+        self.__setstate__({"_table": {}})
 
-    async def _get(self, url: URL, pool: Pool, max_redirects: int = 5) -> RobotsFile:
+    def __getstate__(self) -> dict[str, Any]:
+        """Return the robots files w/o the locks for pickling."""
+        return {"_table": self._table}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the robots files and create new locks."""
+        self._table: dict[URL, RobotsFile] = state["_table"]
+        self._locks: dict[URL, asyncio.Lock] = {}
+        self._lock_users: collections.Counter[URL] = collections.Counter()
+
+    async def _load(self, url: URL, pool: Pool, max_redirects: int) -> RobotsFile:
         assert max_redirects >= 0
 
-        if url in self._table:
-            async with self._table[url].lock:
-                if not self._table[url].expired():
-                    return self._table[url]
-
-        self._table[url] = RobotsFile()
-
-        async with self._table[url].lock:
-            try:
-                response = await pool.get(url, max_redirects == 0)
-            except (InvalidURLError, httpx.TooManyRedirects):
-                self._table[url].allow_all = True
-                return self._table[url]
-            except HTTPError as e:
-                print(f"ROBOTS {url} {e.__class__.__name__}: {e}")
-                self._table[url].disallow_all = True
-                return self._table[url]
-
-            if response.is_redirect:
-                assert response.next_request is not None
-                new_url = URL.from_httpx_url(response.next_request.url)
-                self._table[url] = await self._get(new_url, pool, max_redirects - 1)
-            else:
-                self._table[url].parse(response)
-
-            return self._table[url]
+        robots_file = RobotsFile()
+
+        try:
+            response = await pool.get(url, max_redirects == 0)
+        except (InvalidURLError, httpx.TooManyRedirects):
+            robots_file.allow_all = True
+            return robots_file
+        except HTTPError as e:
+            logger.info(
+                "robots.txt http error %s: %s",
+                e.__class__.__name__,
+                e,
+                extra={"url": url},
+            )
+            robots_file.disallow_all = True
+            return robots_file
+
+        if response.is_redirect:
+            assert response.next_request is not None
+            new_url = URL.from_httpx_url(response.next_request.url)
+            robots_file = self._table[new_url] = await self._load(
+                new_url,
+                pool,
+                max_redirects - 1,
+            )
+            return robots_file
+
+        robots_file.parse(response)
+        return robots_file
 
     async def get(self, host: str, pool: Pool) -> RobotsFile:
         """Get the robots.txt for the given netloc."""
         url = URL(host, "/robots.txt", None)
-        return await self._get(url, pool)
+
+        self._lock_users[url] += 1
+        try:
+            async with self._locks.setdefault(url, asyncio.Lock()):
+                robots_file = self._table.get(url)
+                if robots_file is None or robots_file.expired():
+                    robots_file = self._table[url] = await self._load(url, pool, 5)
+        finally:
+            self._lock_users[url] -= 1
+            if not self._lock_users[url]:
+                del self._lock_users[url]
+                del self._locks[url]
+
+        return robots_file
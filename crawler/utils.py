@@ -1,18 +1,25 @@
 """Utilities for working with URLs and pages."""
 
-import contextlib
 import math
+import re
+from collections.abc import AsyncIterable, Collection
 
 import fasttext
 from lxml import etree, html
 from lxml.html.clean import Cleaner
 
+from . import logger
 from .http import URL, InvalidURLError
 
-_LANG_XPATH = etree.XPath("//*/@lang")
+_LANG_XPATH = etree.XPath("(//*/@lang)[1]")
 _BASE_XPATH = etree.XPath("//base/@href")
 _HREF_XPATH = etree.XPath("//a[not(@rel) or @rel!='nofollow']/@href")
+_HTML_LANG_REGEX = re.compile(
+    rb"<html\b[^>]*?(?<![\w:-])lang\s*=\s*[\"']?\s*([a-z]+)",
+    re.I,
+)
 _MODEL = fasttext.load_model("lid.176.bin")
+_HTML_PARSERS: list[html.HTMLParser] = []
 
 HTML_CLEANER = Cleaner(
     style=True,
@@ -40,31 +47,93 @@ HTML_CLEANER = Cleaner(
 )
 
 
+class UnwantedLanguageError(Exception):
+    """Raised when a page declares a language that is not wanted."""
+
+
+async def parse_html(
+    chunks: AsyncIterable[bytes],
+    langs: Collection[str],
+) -> html.HtmlElement:
+    """
+    Parse a html page incrementally while its chunks arrive.
+
+    If the html tag in the first chunk declares a language not in langs, stop
+    before the rest of the page is read and raise an UnwantedLanguageError.
+    """
+    if _HTML_PARSERS:
+        parser = _HTML_PARSERS.pop()
+    else:
+        parser = html.HTMLParser(
+            remove_blank_text=True,
+            remove_comments=True,
+            remove_pis=True,
+            collect_ids=False,
+        )
+
+    first = True
+    async for chunk in chunks:
+        if first and (match := _HTML_LANG_REGEX.search(chunk)):
+            lang = match[1].decode().lower()
+            if lang not in langs:
+                raise UnwantedLanguageError(lang)
+        first = False
+        parser.feed(chunk)
+
+    try:
+        dom = parser.close()
+    except etree.XMLSyntaxError:
+        dom = None
+    _HTML_PARSERS.append(parser)
+
+    if dom is None:
+        raise etree.ParserError("Document is empty")
+
+    if dom.find("head") is None:
+        dom.insert(0, html.Element("head"))
+    if dom.find("body") is None:
+        dom.append(html.Element("body"))
+
+    return dom
+
+
+def _lang_sample(text: str, size: int = 1023) -> str:
+    """
+    Get up to size characters w/ collapsed whitespace from a third into text.
+
+    The raw window is grown until its collapsed text is long enough, first
+    towards the end and then towards the start of the text.
+    """
+    start = max(0, math.floor(len(text) / 3) - size // 2)
+    end = start + 4 * size
+
+    while len(sample := " ".join(text[start:end].split())) < size:
+        if end < len(text):
+            end += end - start
+        elif start > 0:
+            start = max(0, start - (end - start))
+        else:
+            break
+
+    return sample[:size]
+
+
 def get_lang(dom: html.HtmlElement) -> str:
     """Detect the language of a html page."""
     if (langtags := _LANG_XPATH(dom)):
         return langtags[0].split("-")[0].lower()
 
-    text = " ".join(dom.body.text_content().split())
-    start = max(0, math.floor(len(text) / 3) - 512)
-    text = text[start : start + 1023]
-
+    text = _lang_sample(dom.body.text_content())
     return _MODEL.predict(text)[0][0].removeprefix("__label__")
 
 
 def get_links(url: URL, dom: html.HtmlElement) -> set[URL]:
-    """Get all links of a page."""
-    links = set()
-
+    """Get all normalized links of a page."""
     if (base := _BASE_XPATH(dom)):
         try:
             url = url.join(base[-1])
         except InvalidURLError:
-            print("{url}: invalid base URL: {base[-1]}")
+            logger.info("invalid base URL (%s)", base[-1], extra={"url": url})
             return set()
 
-    for href in _HREF_XPATH(dom):
-        with contextlib.suppress(InvalidURLError):
-            links.add(url.join(href))
-
-    return links
+    return url.join_all(_HREF_XPATH(dom))
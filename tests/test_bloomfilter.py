@@ -0,0 +1,13 @@
+"""Tests for the bloom filter."""
+
+from crawler.bloomfilter import BloomFilter
+
+
+def test_bloomfilter():
+    bloomfilter = BloomFilter(1000, 1e-3)
+    added = {f"https://example.com/{i}" for i in range(1000)}
+    for item in added:
+        bloomfilter.add(item)
+
+    assert all(item in bloomfilter for item in added)
+    assert sum(f"https://example.org/{i}" in bloomfilter for i in range(1000)) < 10
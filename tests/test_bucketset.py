@@ -0,0 +1,65 @@
+"""Tests for the bucket set."""
+
+import operator
+
+import pytest
+
+from crawler.bucketset import BucketSet
+from crawler.http import URL
+
+URLS = {
+    URL("foo.com", "/", None),
+    URL("foo.com", "/bar", None),
+    URL("bar.com", "/", None),
+    URL("bar.com", "/foo", "a=b"),
+}
+
+
+def test_bucketset_add():
+    bucketset = BucketSet(operator.attrgetter("host"))
+    bucketset.update(URLS)
+    bucketset.add(URL("foo.com", "/", None))
+
+    assert len(bucketset) == len(URLS)
+    assert set(bucketset) == URLS
+    assert set(bucketset.keys()) == {"foo.com", "bar.com"}
+    assert all(url in bucketset for url in URLS)
+    assert URL("baz.com", "/", None) not in bucketset
+
+
+def test_bucketset_discard():
+    bucketset = BucketSet(operator.attrgetter("host"))
+    bucketset.update(URLS)
+    bucketset.discard(URL("foo.com", "/", None))
+    bucketset.discard(URL("foo.com", "/bar", None))
+    bucketset.discard(URL("baz.com", "/", None))
+
+    assert len(bucketset) == 2
+    assert set(bucketset.keys()) == {"bar.com"}
+
+
+def test_bucketset_pop():
+    bucketset = BucketSet(operator.attrgetter("host"))
+    bucketset.update(URLS)
+    popped = {bucketset.pop("bar.com"), bucketset.pop("bar.com")}
+
+    assert popped == {url for url in URLS if url.host == "bar.com"}
+    assert set(bucketset.keys()) == {"foo.com"}
+
+
+def test_bucketset_pop_ready():
+    bucketset = BucketSet(operator.attrgetter("host"))
+    bucketset.update(URLS)
+    bucketset.block("foo.com")
+
+    assert bucketset.ready_count() == 1
+    assert bucketset.pop_ready().host == "bar.com"
+    assert bucketset.ready_count() == 0
+    with pytest.raises(KeyError):
+        bucketset.pop_ready()
+
+    bucketset.unblock("bar.com")
+    assert bucketset.pop_ready().host == "bar.com"
+    bucketset.unblock("bar.com")
+    bucketset.unblock("foo.com")
+    assert bucketset.pop_ready().host == "foo.com"
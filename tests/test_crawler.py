@@ -0,0 +1,57 @@
+"""Tests for the crawler."""
+
+import asyncio
+import pickle
+import threading
+import time
+
+from crawler.crawler import Crawler
+from crawler.http import URL
+from crawler.robots import RobotsFileTable
+
+
+def test_crawler_legacy_state():
+    crawler = Crawler.__new__(Crawler)
+    crawler.__setstate__(
+        {
+            "_robots_file_table": RobotsFileTable(),
+            "_timeouts": {"foo.com": 0.0},
+            "_pending_urls": {URL("foo.com", "/", None), URL("bar.com", "/", None)},
+            "_finished_urls": {URL("foo.com", "/bar", None)},
+        },
+    )
+    crawler = pickle.loads(pickle.dumps(crawler))
+
+    assert set(crawler._pending_urls) == {
+        URL("foo.com", "/", None),
+        URL("bar.com", "/", None),
+    }
+    crawler.add_url(URL("foo.com", "/bar/", None))
+    assert len(crawler._pending_urls) == 2
+
+
+def test_crawler_flush_after_cancelled_flush():
+    crawler = Crawler()
+    writes = []
+    lock = threading.Lock()
+
+    def write_documents(new_documents, updated_documents):
+        assert lock.acquire(blocking=False), "concurrent writes"
+        time.sleep(0.1)
+        writes.append(new_documents)
+        lock.release()
+
+    crawler._write_documents = write_documents
+
+    async def flush():
+        crawler._new_documents = [{"url": "https://foo.com/"}]
+        flusher = asyncio.create_task(crawler._flush_documents())
+        await asyncio.sleep(0.01)
+        flusher.cancel()
+
+        crawler._new_documents = [{"url": "https://bar.com/"}]
+        await crawler._flush_documents()
+
+    asyncio.run(flush())
+
+    assert writes == [[{"url": "https://foo.com/"}], [{"url": "https://bar.com/"}]]
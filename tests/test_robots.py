@@ -0,0 +1,125 @@
+"""Tests for the robots.txt files."""
+
+import asyncio
+import pickle
+import urllib.robotparser
+
+import httpx
+import pytest
+
+from crawler.http import URL, USER_AGENT
+from crawler.robots import RobotsFile, RobotsFileTable
+
+ROBOTS_TXT = """
+User-agent: other
+Disallow: /
+
+User-agent: crawler
+Crawl-delay: 2
+Request-rate: 1/4
+Allow: /private/public
+Disallow: /private
+Disallow: /*.pdf
+Disallow: /caf%C3%A9
+
+User-agent: *
+Disallow: /
+"""
+
+URLS = {
+    "https://foo.com/",
+    "https://foo.com/private",
+    "https://foo.com/private/public/page",
+    "https://foo.com/privateer",
+    "https://foo.com/page?q=/private",
+    "https://foo.com/caf%C3%A9/menu",
+    "https://foo.com/doc.pdf",
+}
+
+
+def _robots_file(status_code: int, text: str = "") -> RobotsFile:
+    robots_file = RobotsFile()
+    robots_file.parse(httpx.Response(status_code, text=text))
+    return robots_file
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_robots_file_can_fetch(url: str):
+    expected = urllib.robotparser.RobotFileParser()
+    expected.parse(ROBOTS_TXT.splitlines())
+    expected.modified()
+    robots_file = _robots_file(200, ROBOTS_TXT)
+    unpickled = pickle.loads(pickle.dumps(robots_file))
+
+    assert robots_file.can_fetch(URL.from_string(url)) == expected.can_fetch(
+        USER_AGENT, url
+    )
+    assert unpickled.can_fetch(URL.from_string(url)) == expected.can_fetch(
+        USER_AGENT, url
+    )
+
+
+@pytest.mark.parametrize(
+    ("status_code", "allowed"),
+    [(404, True), (429, False), (500, False)],
+)
+def test_robots_file_can_fetch_error(status_code: int, allowed: bool):
+    robots_file = _robots_file(status_code)
+    assert robots_file.can_fetch(URL.from_string("https://foo.com/")) == allowed
+
+
+def test_robots_file_delay():
+    robots_file = _robots_file(200, ROBOTS_TXT)
+    unpickled = pickle.loads(pickle.dumps(robots_file))
+
+    assert robots_file.delay() == 4
+    assert unpickled.delay() == 4
+    assert _robots_file(404).delay() == 0
+
+
+class _Pool:
+    def __init__(self, responses: dict[str, httpx.Response]) -> None:
+        self.requests: list[str] = []
+        self._responses = responses
+
+    async def get(self, url: URL, allow_redirect: bool) -> httpx.Response:
+        self.requests.append(str(url))
+        await asyncio.sleep(0)
+        return self._responses[str(url)]
+
+
+def test_robots_file_table_get_once():
+    table = RobotsFileTable()
+    pool = _Pool({"https://foo.com/robots.txt": httpx.Response(200, text=ROBOTS_TXT)})
+
+    async def get_all() -> list[RobotsFile]:
+        return await asyncio.gather(*(table.get("foo.com", pool) for _ in range(3)))
+
+    robots_files = asyncio.run(get_all())
+
+    assert pool.requests == ["https://foo.com/robots.txt"]
+    assert all(robots_file is robots_files[0] for robots_file in robots_files)
+    assert not table._locks
+
+
+def test_robots_file_table_get_redirect():
+    table = RobotsFileTable()
+    redirect = httpx.Response(301, headers={"Location": "https://bar.com/robots.txt"})
+    redirect.next_request = httpx.Request("GET", "https://bar.com/robots.txt")
+    pool = _Pool(
+        {
+            "https://foo.com/robots.txt": redirect,
+            "https://bar.com/robots.txt": httpx.Response(200, text=ROBOTS_TXT),
+        },
+    )
+
+    async def get_both() -> tuple[RobotsFile, RobotsFile]:
+        return await table.get("foo.com", pool), await table.get("bar.com", pool)
+
+    foo, bar = asyncio.run(get_both())
+
+    assert foo is bar
+    assert pool.requests == [
+        "https://foo.com/robots.txt",
+        "https://bar.com/robots.txt",
+    ]
@@ -0,0 +1,58 @@
+"""Tests for the page utilities."""
+
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+from crawler.utils import UnwantedLanguageError, _lang_sample, parse_html
+
+LANGS = ("en", "de")
+
+
+async def _chunks(page: bytes) -> AsyncIterator[bytes]:
+    yield page
+
+
+def _parse(page: bytes):
+    return asyncio.run(parse_html(_chunks(page), LANGS))
+
+
+@pytest.mark.parametrize(
+    "html_tag",
+    [
+        b'<html lang="en">',
+        b"<html LANG='de'>",
+        b'<html lang="en-US">',
+        b'<html lang="">',
+        b'<html data-lang="fr" lang="en">',
+        b'<html xml:lang="fr" lang="en">',
+        b'<html xml:lang="fr">',
+    ],
+)
+def test_parse_html_wanted_lang(html_tag: bytes):
+    dom = _parse(html_tag + b"<body><p>text</p></body></html>")
+    assert dom.body.text_content() == "text"
+
+
+@pytest.mark.parametrize(
+    "html_tag",
+    [b'<html lang="fr">', b'<html data-lang="en" lang="fr-FR">'],
+)
+def test_parse_html_unwanted_lang(html_tag: bytes):
+    with pytest.raises(UnwantedLanguageError) as excinfo:
+        _parse(html_tag + b"<body><p>text</p></body></html>")
+    assert str(excinfo.value) == "fr"
+
+
+@pytest.mark.parametrize(
+    ("text", "sample"),
+    [
+        ("word " * 1000, ("word " * 205)[:1023]),
+        (("word" + " " * 60 + "\n") * 1000, ("word " * 205)[:1023]),
+        ("hello world" + " " * 100_000, "hello world"),
+        (" " * 100_000 + "hello world", "hello world"),
+        ("", ""),
+    ],
+)
+def test_lang_sample(text: str, sample: str):
+    assert _lang_sample(text) == sample